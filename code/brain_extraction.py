@@ -6,25 +6,65 @@ Performs skull stripping on T1w anatomical images using FSL BET (Brain Extractio
 This is a simple preprocessing step that removes non-brain tissue from MRI images.
 
 Usage:
-    python brain_extraction.py --input <bids_dir> --output <output_dir> [--subject <sub_id>] [--f <fractional_intensity>]
+    python brain_extraction.py --input <bids_dir> --output <output_dir> [--subject <sub_id> ...] [--subjects-file <file>] [--f <fractional_intensity>]
 
 Example:
     python brain_extraction.py --input /data --output /results --subject 0051160
 
+Multiple subjects are processed concurrently, up to one BET run per CPU core:
+    python brain_extraction.py --input /data --output /results --subject 0051160 --subject 0051161
+
+or listed in a text file, one subject ID per line:
+    python brain_extraction.py --input /data --output /results --subjects-file subjects.txt
+
+On a SLURM cluster, --slurm-array submits the subjects as a job array instead
+of running BET locally:
+    python brain_extraction.py --input /data --output /results --subject 0051160 --subject 0051161 --slurm-array
+
 Author: Tara Neddersen
 Lab: Knowles Lab, Stanford University Department of Neurology
 Date: December 2024
 """
 
 import argparse
+import asyncio
+import collections
+import errno
+import functools
+import gzip
+import hashlib
 import logging
+import mmap
+import shlex
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import json
 from datetime import datetime
 import os
 
+# Optional: only needed for in-process NIfTI header reads
+try:
+    import nibabel
+    import numpy as np
+except ImportError:
+    nibabel = None
+
+try:
+    from indexed_gzip import IndexedGzipFile
+except ImportError:
+    IndexedGzipFile = None
+
+# Optional: faster metadata JSON writes
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -33,24 +73,35 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# RAM-backed filesystem used for decompressed BET inputs (see --decompress)
+TMPFS_DIR = '/dev/shm'
+
+# Environment for FSL subprocesses, built once. PATH must contain system
+# utilities (dc is required by BET)
+_BET_ENV = {**os.environ, 'PATH': f"/usr/bin:{os.environ.get('PATH', '')}"}
+
+# Number of trailing BET stderr lines kept for error messages
+STDERR_TAIL_LINES = 20
+
+# --auto-r: max distance (in voxels) between the scanner origin and the
+# volume centre for BET's robust centre estimation (-R) to be skipped
+AUTO_R_TOLERANCE_VOXELS = 1.0
+
 
 def check_fsl():
     """Check if FSL is available in the environment."""
-    try:
-        result = subprocess.run(['which', 'bet'], capture_output=True, text=True)
-        if result.returncode != 0:
-            # Try Windows path or check FSLDIR
-            if 'FSLDIR' in os.environ:
-                return True
-            logger.error("FSL BET not found. Make sure FSL is installed and in PATH.")
-            return False
+    if shutil.which('bet'):
         return True
-    except FileNotFoundError:
-        # On Windows, try different approach
-        if 'FSLDIR' in os.environ:
-            return True
-        logger.error("FSL not found. This script requires FSL to be installed.")
-        return False
+    # BET not on PATH (e.g. on Windows), check FSLDIR instead
+    if 'FSLDIR' in os.environ:
+        return True
+    logger.error("FSL BET not found. Make sure FSL is installed and in PATH.")
+    return False
+
+
+def _bids_t1w(bids_root, subject_id):
+    """Return the BIDS path of a subject's T1w image, as a string."""
+    return os.path.join(bids_root, f'sub-{subject_id}', 'anat', f'sub-{subject_id}_T1w.nii.gz')
 
 
 def validate_input(input_path):
@@ -58,14 +109,265 @@ def validate_input(input_path):
     if not input_path.exists():
         raise FileNotFoundError(f"Input file not found: {input_path}")
     
-    if not str(input_path).endswith(('.nii', '.nii.gz')):
+    name = input_path.name
+    if not (name.endswith('.nii.gz') or name.endswith('.nii')):
         raise ValueError(f"Input must be a NIfTI file (.nii or .nii.gz), got: {input_path}")
     
     logger.info(f"Input file validated: {input_path}")
     return True
 
 
-def run_bet(input_file, output_file, fractional_intensity=0.5):
+def _open_nifti(path):
+    """
+    Open a NIfTI image without reading its voxel data.
+    
+    For .nii.gz files, indexed_gzip is used (when installed) so that seeks into
+    the compressed stream do not re-inflate the file from the start on every
+    access. Requires nibabel.
+    """
+    if nibabel is None:
+        raise RuntimeError("nibabel is required to read NIfTI headers. Install it with: pip install nibabel")
+    
+    path = os.fspath(path)
+    if path.endswith('.gz') and IndexedGzipFile is not None:
+        fobj = IndexedGzipFile(path)
+        file_map = nibabel.Nifti1Image.make_file_map()
+        file_map['image'].fileobj = fobj
+        return nibabel.Nifti1Image.from_file_map(file_map)
+    
+    return nibabel.load(path)
+
+
+def _origin_near_center(input_file, tolerance=AUTO_R_TOLERANCE_VOXELS):
+    """
+    Check whether the scanner origin lies near the centre of the image volume.
+    
+    Only the NIfTI header is read. Returns False when nibabel is not installed
+    or the header cannot be read, so callers fall back to the safe default.
+    """
+    if nibabel is None:
+        logger.warning("nibabel not installed; cannot check image centre, keeping BET -R")
+        return False
+    
+    try:
+        img = _open_nifti(input_file)
+        try:
+            affine, shape = img.affine, img.shape[:3]
+        finally:
+            fobj = img.file_map['image'].fileobj
+            if fobj is not None:
+                fobj.close()
+    except Exception as e:
+        logger.warning(f"Could not read NIfTI header of {input_file}: {e}")
+        return False
+    
+    origin_voxel = (np.linalg.inv(affine) @ [0, 0, 0, 1])[:3]
+    center_voxel = (np.array(shape) - 1) / 2
+    distance = np.linalg.norm(origin_voxel - center_voxel)
+    logger.debug(f"Origin is {distance:.2f} voxels from the image centre")
+    return distance < tolerance
+
+
+def _gzip_uncompressed_size(path):
+    """Uncompressed size of a gzip file, from its trailer (modulo 4 GiB)."""
+    with open(path, 'rb') as f:
+        f.seek(-4, os.SEEK_END)
+        return int.from_bytes(f.read(4), 'little')
+
+
+def _decompress_to(input_file, tmp_dir):
+    """Decompress a .nii.gz image to a new temporary .nii file in tmp_dir."""
+    prefix = input_file.name[:-len('.nii.gz')] + '_'
+    fd, tmp_path = tempfile.mkstemp(prefix=prefix, suffix='.nii', dir=tmp_dir)
+    try:
+        with open(input_file, 'rb') as raw, os.fdopen(fd, 'wb') as dst:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(raw.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                os.posix_fadvise(raw.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            with gzip.GzipFile(fileobj=raw, mode='rb') as src:
+                shutil.copyfileobj(src, dst, length=8 << 20)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return Path(tmp_path)
+
+
+def _decompress_to_tmpfs(input_file):
+    """
+    Decompress a .nii.gz image to an uncompressed .nii on a RAM-backed filesystem.
+    
+    Uses /dev/shm when it exists and has room for the image, and falls back to
+    the default temp directory otherwise (or if /dev/shm fills up while
+    writing, e.g. Docker's default 64 MB). On Linux the kernel is asked to
+    read the whole compressed file ahead, so disk/NFS reads overlap with
+    decompression. The caller is responsible for removing the returned file.
+    """
+    tmp_dirs = [None]
+    if os.path.isdir(TMPFS_DIR):
+        if shutil.disk_usage(TMPFS_DIR).free > _gzip_uncompressed_size(input_file):
+            tmp_dirs.insert(0, TMPFS_DIR)
+        else:
+            logger.warning(f"Not enough space in {TMPFS_DIR}; decompressing {input_file.name} "
+                           f"to {tempfile.gettempdir()} instead")
+    
+    for tmp_dir in tmp_dirs:
+        try:
+            tmp_path = _decompress_to(input_file, tmp_dir)
+            break
+        except OSError as e:
+            if e.errno != errno.ENOSPC or tmp_dir is None:
+                raise
+            logger.warning(f"{TMPFS_DIR} is full; decompressing {input_file.name} "
+                           f"to {tempfile.gettempdir()} instead")
+    
+    logger.info(f"Decompressed input to: {tmp_path}")
+    return tmp_path
+
+
+def _forward_lines(pipe, log, label, tail=None):
+    """Send each line read from pipe to log, prefixed with label, optionally keeping it in tail."""
+    with pipe:
+        for line in pipe:
+            line = line.rstrip()
+            log(f"[{label}] {line}")
+            if tail is not None:
+                tail.append(line)
+
+
+def _run_streamed(cmd, env, label):
+    """
+    Run a command, forwarding its output to the logger as it is produced.
+    
+    stdout is logged at DEBUG and stderr at WARNING level, each line prefixed
+    with label so output from concurrent runs can be told apart. Output is
+    not buffered in memory; only the last lines of stderr are kept for the
+    error message.
+    
+    Raises:
+    -------
+    subprocess.CalledProcessError if the command exits with a non-zero status
+    """
+    stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        bufsize=1,
+        env=env
+    )
+    readers = [
+        threading.Thread(target=_forward_lines, args=(proc.stdout, logger.debug, label)),
+        threading.Thread(target=_forward_lines, args=(proc.stderr, logger.warning, label, stderr_tail)),
+    ]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    
+    returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr='\n'.join(stderr_tail))
+
+
+def _bet_cache_key(input_file, fractional_intensity, robust=True):
+    """
+    Compute the cache key for a BET run.
+    
+    The key is the SHA-256 of the input image contents, the BET options and
+    the FSL version, so any change to the input, parameters or software
+    produces a new key.
+    """
+    h = hashlib.sha256()
+    with open(input_file, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                h.update(mm)
+    h.update(str(fractional_intensity).encode())
+    h.update(b'-R' if robust else b'')
+    h.update(json.dumps(_fsl_version(), sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def _copy_replace(src, dst):
+    """
+    Copy src to dst through a temporary file that is renamed over dst.
+    
+    dst never shares an inode with src, so a later in-place write to either
+    file cannot change the other, and dst is never seen half-written.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.fspath(dst)) or '.', prefix='.tmp_')
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp_path)
+        shutil.copymode(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _store_in_cache(output_file, cache_dir, cache_key):
+    """Add a BET output to the cache. Failures are logged, not raised."""
+    ext = '.nii.gz' if output_file.name.endswith('.nii.gz') else '.nii'
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        _copy_replace(output_file, cache_dir / f"{cache_key}{ext}")
+    except OSError as e:
+        logger.warning(f"Could not cache BET output in {cache_dir}: {e}")
+
+
+@functools.lru_cache(maxsize=None)
+def make_bet_runner(fractional_intensity, robust=True):
+    """
+    Return a function that runs BET with fixed options on an input/output pair.
+    
+    The option list is built once per (fractional_intensity, robust) pair and
+    the runner is cached, so processing a cohort with the same parameters
+    reuses it for every subject.
+    
+    Parameters:
+    -----------
+    fractional_intensity : float
+        BET fractional intensity threshold (0-1)
+    robust : bool
+        Use robust brain centre estimation (-R)
+    
+    Returns:
+    --------
+    Function run(input_path, output_base) taking string paths; output_base
+    has no extension. Raises subprocess.CalledProcessError if BET fails.
+    The options it passes to BET are available as run.options.
+    """
+    # -f: fractional intensity threshold
+    # -R: robust brain center estimation (recommended for T1w)
+    options = ('-f', str(fractional_intensity), '-R') if robust else ('-f', str(fractional_intensity))
+    
+    def run(input_path, output_base):
+        cmd = ['bet', input_path, output_base, *options]
+        logger.info(f"Command: {' '.join(cmd)}")
+        _run_streamed(cmd, _BET_ENV, os.path.basename(output_base))
+    
+    run.options = options
+    return run
+
+
+def choose_robust(input_file, auto_robust=False):
+    """
+    Decide whether BET should use robust centre estimation (-R).
+    
+    -R is always used unless auto_robust is set and the image header shows
+    the scanner origin already lies at the centre of the volume.
+    """
+    if auto_robust and _origin_near_center(input_file):
+        logger.info("Image origin is at the volume centre; skipping robust centre estimation (-R)")
+        return False
+    return True
+
+
+def run_bet(input_file, output_file, fractional_intensity=0.5, decompress=False, cache_dir=None,
+            robust=True):
     """
     Run FSL BET (Brain Extraction Tool) to perform skull stripping.
     
@@ -78,6 +380,15 @@ def run_bet(input_file, output_file, fractional_intensity=0.5):
     fractional_intensity : float
         BET fractional intensity threshold (0-1). Lower = larger brain mask.
         Default is 0.5 which works well for most T1w images.
+    decompress : bool
+        Decompress a .nii.gz input to a temporary .nii in /dev/shm before
+        running BET, so BET reads uncompressed data from RAM.
+    cache_dir : Path or None
+        Directory of cached BET outputs, keyed by input contents, parameters
+        and FSL version. On a cache hit BET is skipped and the cached output is
+        copied to output_file. None disables caching.
+    robust : bool
+        Use robust brain centre estimation (-R). See choose_robust().
     
     Returns:
     --------
@@ -87,47 +398,106 @@ def run_bet(input_file, output_file, fractional_intensity=0.5):
     logger.info(f"Fractional intensity threshold: {fractional_intensity}")
     
     # BET expects output without extension
-    output_base = str(output_file).replace('.nii.gz', '').replace('.nii', '')
-    
-    # Build BET command
-    # -f: fractional intensity threshold
-    # -R: robust brain center estimation (recommended for T1w)
-    cmd = ['bet', str(input_file), output_base, '-f', str(fractional_intensity), '-R']
-    
-    logger.info(f"Command: {' '.join(cmd)}")
-    
-    # Ensure PATH contains system utilities (dc required by BET)
-    env = os.environ.copy()
-    env["PATH"] = f"/usr/bin:{env.get('PATH', '')}"
+    output_base = os.fspath(output_file)
+    if output_base.endswith('.nii.gz'):
+        output_base = output_base[:-7]
+    elif output_base.endswith('.nii'):
+        output_base = output_base[:-4]
+    
+    # Reuse a previous BET run on identical input and parameters
+    cache_key = None
+    if cache_dir is not None:
+        cache_key = _bet_cache_key(input_file, fractional_intensity, robust)
+        for ext in ('.nii.gz', '.nii'):
+            cached_file = cache_dir / f"{cache_key}{ext}"
+            if cached_file.exists():
+                output_with_ext = output_base + ext
+                _copy_replace(cached_file, output_with_ext)
+                logger.info(f"Reused cached BET output: {cached_file}")
+                logger.info(f"Output saved to: {output_with_ext}")
+                return Path(output_with_ext)
+    
+    # BET writes its output in place; remove any earlier output first so a
+    # stale file is never mistaken for this run's result
+    for ext in ('.nii.gz', '.nii'):
+        if os.path.lexists(output_base + ext):
+            os.remove(output_base + ext)
+    
+    bet_input = input_file
+    if decompress and input_file.suffix == '.gz':
+        bet_input = _decompress_to_tmpfs(input_file)
+    
+    bet = make_bet_runner(fractional_intensity, robust)
     
     try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True,
-            env=env
-        )
+        bet(os.fspath(bet_input), output_base)
         logger.info("BET completed successfully")
         
         # BET adds .nii.gz extension, so check if file exists
-        output_with_ext = Path(f"{output_base}.nii.gz")
-        if not output_with_ext.exists():
+        output_with_ext = output_base + '.nii.gz'
+        if not os.path.exists(output_with_ext):
             # Try without .gz
-            output_with_ext = Path(f"{output_base}.nii")
+            output_with_ext = output_base + '.nii'
         
-        if output_with_ext.exists():
+        if os.path.exists(output_with_ext):
             logger.info(f"Output saved to: {output_with_ext}")
+            output_with_ext = Path(output_with_ext)
+            if cache_key is not None:
+                _store_in_cache(output_with_ext, cache_dir, cache_key)
             return output_with_ext
         else:
             raise FileNotFoundError(f"BET output file not found: {output_base}")
             
     except subprocess.CalledProcessError as e:
-        logger.error(f"BET failed with error: {e.stderr}")
+        logger.error(f"BET failed on {input_file} with exit code {e.returncode}")
         raise RuntimeError(f"Brain extraction failed: {e.stderr}")
     except Exception as e:
         logger.error(f"Unexpected error during BET: {e}")
         raise
+    finally:
+        if bet_input != input_file:
+            os.remove(bet_input)
+
+
+@functools.lru_cache(maxsize=1)
+def _fsl_version():
+    """
+    Look up the installed FSL/BET version.
+    
+    Reads $FSLDIR/etc/fslversion when available and only falls back to
+    running `bet -V`. The result is cached, so the lookup happens once per
+    process no matter how many subjects are processed.
+    """
+    versions = {}
+    if 'FSLDIR' in os.environ:
+        try:
+            with open(os.path.join(os.environ['FSLDIR'], 'etc', 'fslversion')) as f:
+                versions['fsl'] = f.read().strip()
+            return versions
+        except OSError:
+            pass
+    
+    try:
+        result = subprocess.run(
+            ['bet', '-V'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=5, env=_BET_ENV
+        )
+        if result.returncode == 0:
+            versions['fsl_bet'] = result.stdout.decode(errors='replace').strip()
+            return versions
+    except (OSError, subprocess.SubprocessError):
+        pass
+    
+    versions['fsl'] = 'unknown'
+    return versions
+
+
+def _write_json(path, data):
+    """Write data as indented JSON, using orjson when it is installed."""
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
 
 
 def save_metadata(output_dir, input_file, output_file, parameters):
@@ -147,35 +517,33 @@ def save_metadata(output_dir, input_file, output_file, parameters):
         'software_versions': {}
     }
     
-    # Try to get FSL version
-    try:
-        result = subprocess.run(['bet', '-V'], capture_output=True, text=True, timeout=5)
-        if result.returncode == 0:
-            metadata['software_versions']['fsl_bet'] = result.stdout.strip()
-    except:
-        try:
-            # Alternative way to get FSL version
-            if 'FSLDIR' in os.environ:
-                version_file = Path(os.environ['FSLDIR']) / 'etc' / 'fslversion'
-                if version_file.exists():
-                    with open(version_file) as f:
-                        metadata['software_versions']['fsl'] = f.read().strip()
-        except:
-            metadata['software_versions']['fsl'] = 'unknown'
+    # FSL version (looked up once per process)
+    metadata['software_versions'].update(_fsl_version())
     
     # Python version
     metadata['software_versions']['python'] = sys.version.split()[0]
     
     # Save metadata
     metadata_file = output_dir / 'processing_metadata.json'
-    with open(metadata_file, 'w') as f:
-        json.dump(metadata, f, indent=2)
+    _write_json(metadata_file, metadata)
     
     logger.info(f"Metadata saved to: {metadata_file}")
     return metadata_file
 
 
-def process_subject(bids_dir, subject_id, output_dir, fractional_intensity):
+def update_metadata(metadata_file, **fields):
+    """Update fields of an existing processing metadata file."""
+    with open(metadata_file) as f:
+        metadata = json.load(f)
+    metadata.update(fields)
+    _write_json(metadata_file, metadata)
+    
+    logger.debug(f"Metadata updated: {metadata_file}")
+    return metadata_file
+
+
+def process_subject(bids_dir, subject_id, output_dir, fractional_intensity, decompress=False,
+                    cache_dir=None, auto_robust=False):
     """
     Process a single subject's T1w image.
     
@@ -189,14 +557,18 @@ def process_subject(bids_dir, subject_id, output_dir, fractional_intensity):
         Output directory for results
     fractional_intensity : float
         BET fractional intensity parameter
+    decompress : bool
+        Decompress the input to /dev/shm before running BET
+    cache_dir : Path or None
+        BET output cache directory (None disables caching)
+    auto_robust : bool
+        Skip BET -R when the image origin is already at the volume centre
     """
     logger.info(f"Processing subject: sub-{subject_id}")
     
-    # Construct BIDS-compliant input path
-    input_file = bids_dir / f'sub-{subject_id}' / 'anat' / f'sub-{subject_id}_T1w.nii.gz'
-    
-    if not input_file.exists():
-        raise FileNotFoundError(f"Input file not found: {input_file}")
+    # Construct BIDS-compliant input path and validate it
+    input_file = Path(_bids_t1w(os.fspath(bids_dir), subject_id))
+    validate_input(input_file)
     
     # Create output directory for this subject
     subject_output_dir = output_dir / f'sub-{subject_id}'
@@ -205,23 +577,209 @@ def process_subject(bids_dir, subject_id, output_dir, fractional_intensity):
     # Output file (BIDS-compliant naming)
     output_file = subject_output_dir / f'sub-{subject_id}_T1w_brain.nii.gz'
     
-    # Validate input
-    validate_input(input_file)
-    
-    # Run brain extraction
-    result_file = run_bet(input_file, output_file, fractional_intensity)
+    # Decide on -R before writing metadata so the options actually used are recorded
+    robust = choose_robust(input_file, auto_robust)
     
-    # Save metadata
     parameters = {
         'fractional_intensity': fractional_intensity,
+        'auto_robust': auto_robust,
+        'robust_center': robust,
+        'bet_options': list(make_bet_runner(fractional_intensity, robust).options),
         'subject_id': subject_id
     }
-    save_metadata(subject_output_dir, input_file, result_file, parameters)
+    
+    # Save metadata in the background while BET runs, recording the planned
+    # output path; it is corrected below if BET wrote a different extension
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        metadata_future = executor.submit(
+            save_metadata, subject_output_dir, input_file, output_file, parameters
+        )
+        
+        # Run brain extraction
+        try:
+            result_file = run_bet(
+                input_file, output_file, fractional_intensity, decompress, cache_dir, robust
+            )
+        except Exception:
+            # Don't leave metadata behind for a failed run
+            if metadata_future.exception() is None:
+                metadata_future.result().unlink(missing_ok=True)
+            raise
+        
+        metadata_file = metadata_future.result()
+    
+    if result_file != output_file:
+        update_metadata(metadata_file, output_file=str(result_file))
     
     logger.info(f"Successfully processed sub-{subject_id}")
     return result_file
 
 
+async def process_all(bids_dir, subject_ids, output_dir, fractional_intensity, decompress=False,
+                      cache_dir=None, auto_robust=False):
+    """
+    Process several subjects concurrently.
+    
+    Each subject runs process_subject in a worker thread, at most one per CPU
+    core. The threads mostly wait on their BET subprocess, so only BET itself
+    is forked; no Python worker processes are started.
+    
+    Returns:
+    --------
+    List with, per subject, the output file or the exception raised
+    """
+    concurrency = min(len(subject_ids), os.cpu_count() or 1)
+    logger.info(f"Processing {len(subject_ids)} subjects, {concurrency} at a time")
+    
+    loop = asyncio.get_running_loop()
+    
+    async def process_one(executor, subject_id):
+        result_file = await loop.run_in_executor(
+            executor,
+            process_subject,
+            bids_dir, subject_id, output_dir, fractional_intensity, decompress, cache_dir,
+            auto_robust
+        )
+        logger.info(f"done {result_file}")
+        return result_file
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return await asyncio.gather(
+            *(process_one(executor, subject_id) for subject_id in subject_ids),
+            return_exceptions=True
+        )
+
+
+def process_subjects(bids_dir, subject_ids, output_dir, fractional_intensity, decompress=False,
+                     cache_dir=None, auto_robust=False):
+    """
+    Process several subjects concurrently (see process_all).
+    
+    Returns:
+    --------
+    List of subject IDs that failed to process
+    """
+    results = asyncio.run(process_all(
+        bids_dir, subject_ids, output_dir, fractional_intensity, decompress, cache_dir, auto_robust
+    ))
+    
+    failed = []
+    for subject_id, result in zip(subject_ids, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error processing sub-{subject_id}: {result}")
+            failed.append(subject_id)
+    
+    return failed
+
+
+def _sbatch_quote(value):
+    """
+    Quote a value for an #SBATCH directive.
+    
+    sbatch splits directive arguments on whitespace and only understands
+    double quotes and backslash escapes there (not shell single quotes).
+    """
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def submit_slurm_array(bids_dir, subject_ids, output_dir, fractional_intensity,
+                       max_concurrent=10, decompress=False, cache_dir=None, auto_robust=False,
+                       verbose=False):
+    """
+    Submit subjects to SLURM as a job array instead of running BET locally.
+    
+    Writes the subject list and an sbatch script to the output directory. Each
+    array task reads its subject ID from the list and re-invokes this script
+    for that single subject, so the scheduler spreads subjects across nodes.
+    
+    Parameters:
+    -----------
+    bids_dir : Path
+        Root directory of BIDS dataset
+    subject_ids : list of str
+        Subject IDs without 'sub-' prefix
+    output_dir : Path
+        Output directory for results (also receives the submission files)
+    fractional_intensity : float
+        BET fractional intensity parameter
+    max_concurrent : int
+        Maximum number of array tasks running at the same time
+    decompress : bool
+        Pass --decompress through to each array task
+    cache_dir : Path or None
+        BET output cache directory for each array task (None disables caching)
+    auto_robust : bool
+        Pass --auto-r through to each array task
+    verbose : bool
+        Pass --verbose through to each array task
+    
+    Returns:
+    --------
+    Path to the submitted sbatch script
+    """
+    bids_dir = bids_dir.resolve()
+    output_dir = output_dir.resolve()
+    
+    subjects_file = output_dir / '_subjects.txt'
+    subjects_file.write_text(''.join(f"{subject_id}\n" for subject_id in subject_ids))
+    
+    log_dir = output_dir / 'logs'
+    log_dir.mkdir(parents=True, exist_ok=True)
+    
+    task_cmd = [
+        sys.executable, str(Path(__file__).resolve()),
+        '--input', str(bids_dir),
+        '--output', str(output_dir),
+        '--fractional-intensity', str(fractional_intensity),
+    ]
+    if decompress:
+        task_cmd.append('--decompress')
+    if cache_dir is not None:
+        task_cmd += ['--cache-dir', str(cache_dir.resolve())]
+    if auto_robust:
+        task_cmd.append('--auto-r')
+    if verbose:
+        task_cmd.append('--verbose')
+    
+    script = output_dir / '_submit.sh'
+    script.write_text(
+        "#!/bin/bash\n"
+        "#SBATCH --job-name=brain_extraction\n"
+        f"#SBATCH --array=1-{len(subject_ids)}%{max_concurrent}\n"
+        "#SBATCH --cpus-per-task=2\n"
+        "#SBATCH --mem=4G\n"
+        f"#SBATCH --output={_sbatch_quote(str(log_dir / '%x_%A_%a.out'))}\n"
+        "\n"
+        f'SUB_ID=$(sed -n "${{SLURM_ARRAY_TASK_ID}}p" {shlex.quote(str(subjects_file))})\n'
+        f'{shlex.join(task_cmd)} --subject "$SUB_ID"\n'
+    )
+    
+    logger.info(f"Submitting SLURM array of {len(subject_ids)} subjects: {script}")
+    result = subprocess.run(['sbatch', str(script)], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"sbatch failed: {result.stderr.strip()}")
+    
+    logger.info(result.stdout.strip())
+    return script
+
+
+def read_subjects_file(subjects_file):
+    """
+    Read subject IDs from a text file, one per line.
+    
+    Blank lines and lines starting with '#' are ignored, and an optional
+    'sub-' prefix is stripped.
+    """
+    subject_ids = []
+    with open(subjects_file) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            subject_ids.append(line[len('sub-'):] if line.startswith('sub-') else line)
+    return subject_ids
+
+
 def main():
     """Main execution function."""
     parser = argparse.ArgumentParser(
@@ -234,6 +792,15 @@ Examples:
   
   # With custom fractional intensity
   python brain_extraction.py --input /data --output /results --subject 0051160 --f 0.4
+
+  # Process several subjects in parallel
+  python brain_extraction.py --input /data --output /results --subject 0051160 --subject 0051161
+
+  # Process every subject listed in a file (one ID per line)
+  python brain_extraction.py --input /data --output /results --subjects-file subjects.txt
+
+  # Submit subjects as a SLURM job array
+  python brain_extraction.py --input /data --output /results --subject 0051160 --subject 0051161 --slurm-array
         """
     )
     
@@ -254,8 +821,16 @@ Examples:
     parser.add_argument(
         '--subject',
         type=str,
-        required=True,
-        help='Subject ID without sub- prefix (e.g., 0051160)'
+        action='append',
+        default=[],
+        help='Subject ID without sub- prefix (e.g., 0051160). '
+             'Repeat to process several subjects in parallel.'
+    )
+    
+    parser.add_argument(
+        '--subjects-file',
+        type=Path,
+        help='Text file with one subject ID per line; all subjects are processed in this run'
     )
     
     parser.add_argument(
@@ -267,6 +842,40 @@ Examples:
         help='BET fractional intensity threshold (0-1, default: 0.5)'
     )
     
+    parser.add_argument(
+        '--auto-r',
+        action='store_true',
+        dest='auto_robust',
+        help='Skip BET robust centre estimation (-R) when the image header shows the '
+             'origin is already at the volume centre (requires nibabel)'
+    )
+    
+    parser.add_argument(
+        '--decompress',
+        action='store_true',
+        help='Decompress .nii.gz inputs to /dev/shm before running BET'
+    )
+    
+    parser.add_argument(
+        '--cache-dir',
+        type=Path,
+        help='Cache BET outputs in this directory and reuse them when input and parameters '
+             'are unchanged (default: no caching)'
+    )
+    
+    parser.add_argument(
+        '--slurm-array',
+        action='store_true',
+        help='Submit subjects as a SLURM job array (via sbatch) instead of running BET locally'
+    )
+    
+    parser.add_argument(
+        '--slurm-max-concurrent',
+        type=int,
+        default=10,
+        help='Maximum number of SLURM array tasks running at once (default: 10)'
+    )
+    
     parser.add_argument(
         '--verbose',
         action='store_true',
@@ -275,6 +884,19 @@ Examples:
     
     args = parser.parse_args()
     
+    subjects = list(args.subject)
+    if args.subjects_file is not None:
+        try:
+            subjects += read_subjects_file(args.subjects_file)
+        except OSError as e:
+            parser.error(f"cannot read --subjects-file: {e}")
+    # Drop duplicates so two workers never write the same output
+    subjects = list(dict.fromkeys(subjects))
+    if not subjects:
+        parser.error("at least one --subject or a --subjects-file is required")
+    if args.slurm_max_concurrent < 1:
+        parser.error("--slurm-max-concurrent must be at least 1")
+    
     if args.verbose:
         logger.setLevel(logging.DEBUG)
     
@@ -283,8 +905,8 @@ Examples:
     logger.info("Author: Tara Neddersen")
     logger.info("=" * 60)
     
-    # Check FSL is available
-    if not check_fsl():
+    # Check FSL is available (not needed on the submit host for SLURM arrays)
+    if not args.slurm_array and not check_fsl():
         logger.error("FSL not found. Please ensure FSL is installed and in your PATH.")
         sys.exit(1)
     
@@ -296,23 +918,66 @@ Examples:
     # Create output directory
     args.output.mkdir(parents=True, exist_ok=True)
     
-    try:
-        # Process subject
-        result_file = process_subject(
+    cache_dir = args.cache_dir
+    
+    if args.slurm_array:
+        try:
+            submit_slurm_array(
+                args.input,
+                subjects,
+                args.output,
+                args.fractional_intensity,
+                max_concurrent=args.slurm_max_concurrent,
+                decompress=args.decompress,
+                cache_dir=cache_dir,
+                auto_robust=args.auto_robust,
+                verbose=args.verbose
+            )
+        except (OSError, RuntimeError) as e:
+            logger.error(f"Error submitting SLURM array: {e}")
+            sys.exit(1)
+        return
+    
+    if len(subjects) == 1:
+        try:
+            # Process subject
+            result_file = process_subject(
+                args.input,
+                subjects[0],
+                args.output,
+                args.fractional_intensity,
+                args.decompress,
+                cache_dir,
+                args.auto_robust
+            )
+            
+            logger.info("=" * 60)
+            logger.info("Processing completed successfully!")
+            logger.info(f"Output saved to: {result_file}")
+            logger.info("=" * 60)
+            
+        except Exception as e:
+            logger.error(f"Error during processing: {e}", exc_info=True)
+            sys.exit(1)
+    else:
+        failed = process_subjects(
             args.input,
-            args.subject,
+            subjects,
             args.output,
-            args.fractional_intensity
+            args.fractional_intensity,
+            args.decompress,
+            cache_dir,
+            args.auto_robust
         )
         
         logger.info("=" * 60)
-        logger.info("Processing completed successfully!")
-        logger.info(f"Output saved to: {result_file}")
+        if failed:
+            logger.error(f"Processing failed for {len(failed)} of {len(subjects)} subjects: "
+                         f"{', '.join(failed)}")
+            logger.info("=" * 60)
+            sys.exit(1)
+        logger.info(f"Processing completed successfully for {len(subjects)} subjects!")
         logger.info("=" * 60)
-        
-    except Exception as e:
-        logger.error(f"Error during processing: {e}", exc_info=True)
-        sys.exit(1)
 
 
 if __name__ == '__main__':
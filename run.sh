@@ -3,6 +3,9 @@
 SUBJECT=${1:-0051160}
 FRACTIONAL_INTENSITY=${2:-0.5}
 
+# If you add --decompress, also pass --shm-size (e.g. --shm-size=1g):
+# Docker's default 64 MB /dev/shm is too small for several decompressed
+# T1w images at once, and the pipeline then falls back to /tmp.
 docker run --rm \
   --platform=linux/amd64 \
   -v "$(pwd)/data:/data:ro" \